@@ -1,9 +1,12 @@
+import time
+
 import streamlit as st
+import altair as alt
 import pandas as pd
 import numpy as np
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from datetime import datetime
+from types import MappingProxyType
+
+from nutrient_core import ELEMENTS as _ELEMENTS, NutrientVector, VoogtNutrientAlgorithm
 
 # ==============================================================================
 # CONFIGURATION ET SÉCURITÉ (A MODIFIER PAR L'UTILISATEUR)
@@ -17,127 +20,59 @@ SHEET_NAME = "Donnees_Fertigation_Raw"
 # ==============================================================================
 # MODULE 1 : GESTIONNAIRE DE BASE DE DONNÉES (LOGGER)
 # ==============================================================================
-class DataLogger:
-    """
-    Gère la connexion sécurisée vers Google Sheets pour l'archivage longitudinal.
-    """
-    def __init__(self, json_key_file, sheet_name):
-        self.json_file = json_key_file
-        self.sheet_name = sheet_name
-        # Définition des droits d'accès (Scopes)
-        self.scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-
-    def log_experiment(self, crop_name, targets, analysis, final_drip, ec_target):
-        """
-        Connecte au Cloud et ajoute une ligne d'historique.
-        """
-        try:
-            # Authentification
-            creds = ServiceAccountCredentials.from_json_keyfile_name(self.json_file, self.scope)
-            client = gspread.authorize(creds)
-            
-            # Ouverture du classeur
-            sheet = client.open(self.sheet_name).sheet1
-            
-            # Création de l'horodatage
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Construction de la ligne de données (Flat Data)
-            # Structure : [Date, Culture, EC_Cible, NO3_T, NO3_A, NO3_Res, ..., NH4_T, NH4_A, NH4_Res]
-            row = [timestamp, crop_name, ec_target]
-            
-            elements = ['NO3', 'H2PO4', 'SO4', 'K', 'Ca', 'Mg', 'NH4']
-            
-            for el in elements:
-                row.append(float(targets.get(el, 0)))    # T = Target (Cible)
-                row.append(float(analysis.get(el, 0)))   # A = Analysis (Reçu)
-                row.append(float(final_drip.get(el, 0))) # Res = Resultat (Goutteur)
-                
-            # Envoi vers le Cloud
-            sheet.append_row(row)
-            return True, "✅ Données archivées avec succès dans Google Sheets."
-            
-        except FileNotFoundError:
-            return False, f"❌ Fichier clé '{self.json_file}' introuvable. Vérifiez le dossier."
-        except Exception as e:
-            return False, f"❌ Erreur API Google : {str(e)}"
+# L'archivage vit dans cloud_logger.py ; le module n'est importé que dans
+# la section Cloud, au moment où l'utilisateur s'en sert réellement.
 
 # ==============================================================================
 # MODULE 2 : MOTEUR DE CALCUL SCIENTIFIQUE (VOOGT)
 # ==============================================================================
-class VoogtNutrientAlgorithm:
-    def __init__(self):
-        self.valences = {
-            'K': 1, 'Ca': 2, 'Mg': 2, 'NH4': 1, 'Na': 1,
-            'NO3': 1, 'SO4': 2, 'H2PO4': 1, 'Cl': 1, 'HCO3': 1
-        }
-
-    def calculate_drip_recipe(self, target_vals, analysis_vals, uptake_vals, water_vals, target_ec, correction_factor):
-        elements = ['NO3', 'H2PO4', 'SO4', 'K', 'Ca', 'Mg', 'NH4']
-        warnings = []
-        
-        # A. Feedback (Ajustement)
-        adjusted_vals = {}
-        for el in elements:
-            gap = target_vals.get(el, 0.0) - analysis_vals.get(el, 0.0)
-            
-            # Heuristique : Plafonnement
-            max_correction = target_vals.get(el, 0.0) * 0.6
-            correction_term = gap * correction_factor
-            
-            if abs(correction_term) > max_correction:
-                correction_term = max_correction if gap > 0 else -max_correction
-                warnings.append(f"⚠️ {el} : Correction plafonnée (Sécurité).")
-
-            base_calc = uptake_vals.get(el, 0.0) + correction_term
-            if base_calc < 0: base_calc = 0
-            
-            adjusted_vals[el] = base_calc
-
-        # B. Équilibrage Ionique
-        sum_cations = sum(adjusted_vals[el] * self.valences[el] for el in ['K', 'Ca', 'Mg', 'NH4'])
-        sum_anions = sum(adjusted_vals[el] * self.valences[el] for el in ['NO3', 'SO4', 'H2PO4'])
-        imbalance = sum_cations - sum_anions
-        
-        if imbalance > 0.1: 
-            adjusted_vals['NO3'] += imbalance / self.valences['NO3']
-        elif imbalance < -0.1:
-            missing = abs(imbalance)
-            adjusted_vals['K'] += (missing * 0.5) / self.valences['K']
-            adjusted_vals['Ca'] += (missing * 0.5) / self.valences['Ca']
-
-        # C. Correction EC
-        current_meq = sum(adjusted_vals[el] * self.valences[el] for el in ['K', 'Ca', 'Mg', 'NH4'])
-        if current_meq < 0.1: current_meq = 0.1
-        estimated_ec = current_meq / 10.0 
-        if estimated_ec < 0.2: estimated_ec = 0.2
-        
-        ec_ratio = target_ec / estimated_ec
-        
-        final_drip_conc = {}
-        for el in elements:
-            if el in ['NH4', 'H2PO4']: 
-                final_drip_conc[el] = adjusted_vals[el] 
-            else:
-                final_drip_conc[el] = adjusted_vals[el] * ec_ratio
-
-        # D. Soustraction Eau Brute
-        fertilizer_needs = {}
-        for el in elements:
-            need = final_drip_conc[el] - water_vals.get(el, 0.0)
-            if need < 0:
-                need = 0
-                warnings.append(f"🚨 {el} : Surcharge via Eau de Source.")
-            fertilizer_needs[el] = need
-
-        df_results = pd.DataFrame({
-            'Cible': target_vals,
-            'Analyse': analysis_vals,
-            'Goutteur': final_drip_conc,
-            'Besoin Net': fertilizer_needs
-        })
-        
-        return df_results.round(2), warnings, final_drip_conc
+# Le moteur vit désormais dans nutrient_core.py (noyau compilé Numba) ;
+# l'app n'en consomme que l'adaptateur et l'ordre canonique des ions.
+
+@st.cache_resource(show_spinner=False)
+def _get_advisor():
+    """Instance unique du moteur par processus (objet immuable, partageable)."""
+    return VoogtNutrientAlgorithm()
+
+
+@st.cache_data(show_spinner=False)
+def _bar_spec(df, cols):
+    """
+    Spécification Vega-Lite du comparatif en barres, construite au plus une
+    fois par résultat : la conversion DataFrame -> spec ne se refait pas
+    à chaque rerun. Les colonnes viennent du bloc contigu de résultats,
+    sans réalignement d'index (pas de pd.Series sur dict).
+    """
+    melted = df[list(cols)].reset_index().melt('index')
+    return alt.Chart(melted).mark_bar().encode(
+        x=alt.X('index:N', title='Ion', sort=list(df.index)),
+        y=alt.Y('value:Q', title='mmol/L'),
+        color=alt.Color('variable:N', title=None),
+        xOffset='variable:N'
+    ).to_dict()
+
+
+@st.cache_data(show_spinner=False)
+def _df_to_csv(df):
+    """Sérialise le tableau de résultats au plus une fois par résultat unique."""
+    return df.to_csv().encode('utf-8')
+
+
+@st.cache_data(show_spinner=False)
+def _compute(X, target_ec, correction_factor):
+    """
+    Couche de mémoïsation : Streamlit ré-exécute tout le script à chaque
+    interaction, ce cache évite de refaire le calcul quand les entrées
+    n'ont pas changé. X est le bloc SoA (4, 7) attendu par compute_vec :
+    lignes (cible, analyse, absorption, eau) dans l'ordre _ELEMENTS.
+    """
+    advisor = _get_advisor()
+    result = advisor.compute_vec(X, target_ec, correction_factor)
+    return (
+        advisor.to_dataframe(result),
+        advisor.warnings(result),
+        dict(zip(_ELEMENTS, result.final_drip)),
+    )
 
 # ==============================================================================
 # MODULE 3 : INTERFACE UTILISATEUR (STREAMLIT)
@@ -162,6 +97,30 @@ CROP_PROFILES = {
     }
 }
 
+# Profils figés + vecteurs précalculés à l'import : chaque rerun consomme
+# directement des ndarrays au lieu de redéballer les dicts imbriqués.
+def _frozen_vec(values):
+    arr = np.fromiter((values[e] for e in _ELEMENTS), np.float64, count=7)
+    arr.flags.writeable = False
+    return arr
+
+
+_CROP_ARRAYS = MappingProxyType({
+    name: MappingProxyType({
+        'targets': _frozen_vec(p['targets']),
+        'uptake': _frozen_vec(p['uptake']),
+        'default_ec': p['default_ec'],
+    })
+    for name, p in CROP_PROFILES.items()
+})
+CROP_PROFILES = MappingProxyType(CROP_PROFILES)
+
+# Défauts "Eau Source" figés à l'import : plus de test d'appartenance
+# reconstruit à chaque rerun dans la boucle de rendu.
+_WATER_DEFAULTS = MappingProxyType(
+    {e: 0.5 if e in frozenset({'Ca', 'Mg', 'SO4'}) else 0.0 for e in _ELEMENTS}
+)
+
 st.set_page_config(page_title="Voogt Research Assistant", layout="wide", page_icon="📡")
 
 st.title("📡 Système Intégré de Fertigation (Voogt & Cloud Data)")
@@ -171,56 +130,94 @@ st.markdown("**Version Connectée.** Les calculs sont effectués localement, les
 with st.sidebar:
     st.header("Paramètres")
     selected_crop = st.selectbox("Culture", list(CROP_PROFILES.keys()))
-    profile = CROP_PROFILES[selected_crop]
+    profile = _CROP_ARRAYS[selected_crop]
     target_ec = st.number_input("EC Cible", value=profile["default_ec"], step=0.1)
     correction_factor = st.slider("Facteur Correction", 0.0, 1.0, 0.5)
 
+# Anti-rebond du slider : un glissement déclenche un rerun par valeur
+# intermédiaire ; on n'en laisse aboutir qu'un toutes les 150 ms quand seul
+# le facteur a bougé (le rerun du relâchement, plus tardif, passe toujours).
+if correction_factor != st.session_state.get('debounced_factor'):
+    st.session_state['debounced_factor'] = correction_factor
+    _now = time.monotonic()
+    _recent = _now - st.session_state.get('factor_rerun_ts', 0.0) < 0.15
+    st.session_state['factor_rerun_ts'] = _now
+    if _recent:
+        st.stop()
+
 # --- SAISIE ---
-defaults_t = profile["targets"]
-defaults_u = profile["uptake"]
-elements_order = ['NO3', 'H2PO4', 'SO4', 'K', 'Ca', 'Mg', 'NH4']
+elements_order = list(_ELEMENTS)
+
+
+@st.cache_data(show_spinner=False)
+def _default_grid(crop_name):
+    """Grille de défauts par culture, construite une fois par culture."""
+    p = _CROP_ARRAYS[crop_name]
+    return pd.DataFrame({
+        'Cible': p['targets'],
+        'Analyse': p['targets'],
+        'Eau Source': [_WATER_DEFAULTS[el] for el in _ELEMENTS],
+        'Absorption': p['uptake'],
+    }, index=list(_ELEMENTS))
+
 
 with st.form("input_form"):
-    c1, c2, c3, c4 = st.columns(4)
-    inputs_target = {}
-    inputs_analysis = {}
-    inputs_water = {}
-    inputs_uptake = {}
-
-    with c1:
-        st.write("Target (Cible)")
-        for el in elements_order:
-            inputs_target[el] = st.number_input(f"{el} T", value=defaults_t.get(el, 0.0), key=f"t_{el}")
-    with c2:
-        st.write("Analyse (Reçu)")
-        for el in elements_order:
-            inputs_analysis[el] = st.number_input(f"{el} A", value=defaults_t.get(el, 0.0), key=f"a_{el}")
-    with c3:
-        st.write("Eau Source")
-        for el in elements_order:
-            val = 0.5 if el in ['Ca', 'Mg', 'SO4'] else 0.0
-            inputs_water[el] = st.number_input(f"{el} E", value=val, key=f"w_{el}")
-    with c4:
-        st.write("Absorption")
-        for el in elements_order:
-            inputs_uptake[el] = st.number_input(f"{el} Abs", value=defaults_u.get(el, 0.0), key=f"u_{el}")
+    # Une seule grille éditable remplace les 28 number_input :
+    # un aller-retour widget au lieu de 28 par rerun.
+    edited = st.data_editor(_default_grid(selected_crop), num_rows='fixed', use_container_width=True, key='ion_grid')
 
     submitted = st.form_submit_button("🚀 Calculer")
 
+inputs_target = edited['Cible'].to_dict()
+inputs_analysis = edited['Analyse'].to_dict()
+inputs_water = edited['Eau Source'].to_dict()
+inputs_uptake = edited['Absorption'].to_dict()
+
 # --- TRAITEMENT ---
-if submitted:
-    advisor = VoogtNutrientAlgorithm()
-    df_results, alerts, final_drip = advisor.calculate_drip_recipe(
-        inputs_target, inputs_analysis, inputs_uptake, inputs_water, target_ec, correction_factor
+# Signature des entrées : on ne recalcule que sur soumission ou si les
+# entrées ont bougé depuis le dernier calcul ; sinon les résultats stockés
+# en session sont réaffichés tels quels (ils survivent ainsi aux clics
+# qui ne passent pas par le formulaire, comme les boutons Cloud).
+input_sig = hash((
+    selected_crop, target_ec, correction_factor,
+    NutrientVector(*edited['Cible']), NutrientVector(*edited['Analyse']),
+    NutrientVector(*edited['Eau Source']), NutrientVector(*edited['Absorption']),
+))
+
+if submitted or ('last_sig' in st.session_state and input_sig != st.session_state['last_sig']):
+    st.session_state['last_sig'] = input_sig
+    st.session_state['last_results'] = _compute(
+        edited[['Cible', 'Analyse', 'Absorption', 'Eau Source']].to_numpy(np.float64).T,
+        target_ec, correction_factor
     )
 
+if 'last_results' in st.session_state:
+    df_results, alerts, final_drip = st.session_state['last_results']
+
     st.divider()
     
     # Section Résultats
     r1, r2 = st.columns([2, 1])
     with r1:
         st.subheader("Résultats Numériques")
-        st.dataframe(df_results.style.background_gradient(subset=['Besoin Net'], cmap="Greens"), use_container_width=True)
+        # Rendu brut + ProgressColumn : le dégradé est dessiné côté client,
+        # sans passer par le Styler pandas (rendu cellule par cellule en Python).
+        besoin_max = float(df_results['Besoin Net (Engrais)'].max())
+        st.dataframe(
+            df_results,
+            column_config={
+                'Besoin Net (Engrais)': st.column_config.ProgressColumn(
+                    min_value=0.0, max_value=max(besoin_max, 1e-9), format='%.2f'
+                )
+            },
+            use_container_width=True
+        )
+        st.download_button(
+            "⬇️ Exporter en CSV",
+            data=_df_to_csv(df_results),
+            file_name=f"recette_{selected_crop}.csv",
+            mime="text/csv"
+        )
     with r2:
         st.subheader("Contrôle Qualité")
         if alerts:
@@ -229,19 +226,39 @@ if submitted:
             st.success("Paramètres nominaux.")
 
     st.divider()
-    
+
+    # Section Visualisation
+    st.subheader("Comparatif Ionique")
+    st.vega_lite_chart(
+        _bar_spec(df_results, ('Cible (Target)', 'Analyse (Labo)', 'Sol. Goutteur (Brut)')),
+        use_container_width=True
+    )
+
+    st.divider()
+
     # Section Archivage (Cloud)
     st.subheader("💾 Archivage des Données (Cloud)")
     col_cloud1, col_cloud2 = st.columns([3, 1])
     
     with col_cloud1:
         st.info(f"Destination : Google Sheet '{SHEET_NAME}'. Assurez-vous que le fichier JSON est présent.")
-        
+
     with col_cloud2:
-        if st.button("Envoyer vers Google Sheets"):
-            logger = DataLogger(GOOGLE_JSON_FILE, SHEET_NAME)
+        # Import différé : coût payé au premier usage de la section Cloud
+        from cloud_logger import DataLogger
+
+        logger = DataLogger(GOOGLE_JSON_FILE, SHEET_NAME)
+        if st.button("Mettre en tampon"):
             success, msg = logger.log_experiment(selected_crop, inputs_target, inputs_analysis, final_drip, target_ec)
-            
+            if success:
+                st.success(msg)
+            else:
+                st.error(msg)
+
+        n_pending = len(st.session_state.get('pending_log_rows', []))
+        if st.button(f"Synchroniser vers Google Sheets ({n_pending})"):
+            success, msg = logger.flush_pending()
+
             if success:
                 st.balloons()
                 st.success(msg)
@@ -0,0 +1,20 @@
+"""
+Compilation AOT (numba.pycc) du noyau Voogt en extension native.
+
+Usage : python build_kernels.py
+
+Produit recipe_kernel.<plateforme>.so à côté des sources ; nutrient_core
+le préfère au JIT s'il est importable. L'artefact est propre à la
+plateforme et n'est pas versionné — sans lui, l'application retombe sur
+@njit(cache=True), qui reste la voie par défaut.
+"""
+from numba.pycc import CC
+
+from nutrient_core import _KERNEL_SIG, _recipe_kernel_py
+
+cc = CC('recipe_kernel')
+cc.export('recipe', _KERNEL_SIG)(_recipe_kernel_py)
+
+if __name__ == '__main__':
+    cc.compile()
+    print("recipe_kernel compilé : nutrient_core l'utilisera au prochain import.")
@@ -0,0 +1,120 @@
+"""
+Archivage longitudinal vers Google Sheets, isolé de l'application.
+
+Le module n'est importé qu'au premier passage dans la section Cloud, et
+les bibliothèques Google (gspread, oauth2client) ne sont chargées qu'au
+premier accès réel à la feuille : les sessions qui n'archivent rien ne
+paient ni l'import ni la poignée de main OAuth.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import streamlit as st
+
+from nutrient_core import ELEMENTS
+
+# Définition des droits d'accès (Scopes)
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+# Un seul worker suffit : les écritures partent dans l'ordre, hors du rerun Streamlit
+_LOG_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+# Schéma de la trace locale (mêmes colonnes que la ligne plate envoyée au Sheet)
+_LOCAL_COLUMNS = ('date', 'culture', 'ec_cible') + tuple(
+    f"{el}_{suffix}" for el in ELEMENTS for suffix in ('cible', 'analyse', 'goutteur')
+)
+
+
+@st.cache_resource(show_spinner=False)
+def _gs_sheet(json_key_file, sheet_name):
+    """
+    Construit le client gspread autorisé une seule fois par processus :
+    lecture de la clé JSON, poignée de main OAuth et ouverture du classeur
+    ne sont plus payées à chaque clic. Les bibliothèques Google sont
+    importées ici (et non en tête de module) pour ne pas alourdir le
+    démarrage des sessions qui n'archivent jamais rien.
+    """
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    creds = ServiceAccountCredentials.from_json_keyfile_name(json_key_file, SCOPES)
+    return gspread.authorize(creds).open(sheet_name).sheet1
+
+
+class DataLogger:
+    """
+    Gère la connexion sécurisée vers Google Sheets pour l'archivage longitudinal.
+    """
+    # Au-delà de ce nombre de lignes en tampon, la synchronisation part seule
+    FLUSH_THRESHOLD = 10
+
+    # Dossier de la trace Parquet locale (écrite avant tout envoi réseau)
+    LOCAL_DIR = "./experiments"
+
+    def __init__(self, json_key_file, sheet_name):
+        self.json_file = json_key_file
+        self.sheet_name = sheet_name
+
+    def _persist_local(self, row):
+        """
+        Trace locale immédiate en Parquet : l'expérience est sur disque
+        avant même la synchronisation Cloud, donc rien n'est perdu si la
+        session se ferme avec des lignes encore en tampon.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pylist([dict(zip(_LOCAL_COLUMNS, row))])
+            pq.write_to_dataset(table, root_path=self.LOCAL_DIR)
+        except Exception:
+            # Filet de sécurité uniquement : son échec ne bloque pas le tampon
+            pass
+
+    def log_experiment(self, crop_name, targets, analysis, final_drip, ec_target):
+        """
+        Met une ligne d'historique en tampon de session ; aucune requête
+        réseau ici. L'envoi groupé se fait via flush_pending().
+        """
+        # Création de l'horodatage
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        # Construction de la ligne de données (Flat Data)
+        # Structure : [Date, Culture, EC_Cible, NO3_T, NO3_A, NO3_Res, ..., NH4_T, NH4_A, NH4_Res]
+        row = [timestamp, crop_name, ec_target]
+
+        for el in ELEMENTS:
+            row.append(float(targets.get(el, 0)))    # T = Target (Cible)
+            row.append(float(analysis.get(el, 0)))   # A = Analysis (Reçu)
+            row.append(float(final_drip.get(el, 0))) # Res = Resultat (Goutteur)
+
+        # Persistance locale hors du rerun (même worker que les envois Cloud)
+        _LOG_EXECUTOR.submit(self._persist_local, row)
+
+        pending = st.session_state.setdefault('pending_log_rows', [])
+        pending.append(row)
+        if len(pending) >= self.FLUSH_THRESHOLD:
+            return self.flush_pending()
+        return True, f"✅ Ligne en tampon ({len(pending)} en attente de synchronisation)."
+
+    def flush_pending(self):
+        """
+        Envoie toutes les lignes en attente en UNE requête append_rows
+        (au lieu d'un aller-retour HTTP par expérience), en arrière-plan.
+        """
+        pending = st.session_state.get('pending_log_rows', [])
+        if not pending:
+            return True, "Rien à synchroniser."
+
+        try:
+            # Client mis en cache (st.cache_resource) : coût payé au premier appel
+            sheet = _gs_sheet(self.json_file, self.sheet_name)
+        except FileNotFoundError:
+            return False, f"❌ Fichier clé '{self.json_file}' introuvable. Vérifiez le dossier."
+        except Exception as e:
+            return False, f"❌ Erreur API Google : {str(e)}"
+
+        rows = list(pending)
+        pending.clear()
+        _LOG_EXECUTOR.submit(sheet.append_rows, rows, value_input_option='USER_ENTERED')
+        return True, f"✅ {len(rows)} ligne(s) envoyées vers Google Sheets en une requête."
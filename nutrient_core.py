@@ -0,0 +1,238 @@
+"""
+Noyau numérique de l'algorithme Voogt, séparé de l'interface Streamlit.
+
+La partie arithmétique est compilée en natif via Numba (@njit) ; la classe
+VoogtNutrientAlgorithm n'est plus qu'un adaptateur fin qui assemble les
+vecteurs, appelle le noyau et décode les drapeaux d'alerte en messages.
+"""
+from types import MappingProxyType
+from typing import ClassVar, NamedTuple
+
+import numpy as np
+import pandas as pd
+from numba import njit
+
+# Ordre canonique des ions et tables précalculées (évite les dicts dans la boucle chaude)
+ELEMENTS = ('NO3', 'H2PO4', 'SO4', 'K', 'Ca', 'Mg', 'NH4')
+VALENCES = {
+    'K': 1, 'Ca': 2, 'Mg': 2, 'NH4': 1, 'Na': 1,
+    'NO3': 1, 'SO4': 2, 'H2PO4': 1, 'Cl': 1, 'HCO3': 1
+}
+_VAL = np.array([VALENCES[e] for e in ELEMENTS], dtype=np.float64)
+
+# Position de chaque ion dans l'ordre canonique : les chemins chauds
+# adressent les vecteurs par entier, jamais par hachage de chaîne.
+IDX = MappingProxyType({e: i for i, e in enumerate(ELEMENTS)})
+_CAT_MASK = np.array([False, False, False, True, True, True, True])
+_AN_MASK = np.array([True, True, True, False, False, False, False])
+# NH4 et H2PO4 ne sont pas rescalés par la correction EC
+_SCALE_MASK = np.array([True, False, True, True, True, True, False])
+_NO3_IDX, _K_IDX, _CA_IDX = IDX['NO3'], IDX['K'], IDX['Ca']
+
+# Colonnes du tableau de résultats (dans l'ordre du np.stack)
+_RESULT_COLUMNS = (
+    'Cible (Target)', 'Analyse (Labo)', 'Ajusté (Feedback)',
+    'Sol. Goutteur (Brut)', 'Eau Source', 'Besoin Net (Engrais)'
+)
+
+# Bits du masque d'alerte retourné par le noyau (pas de chaînes en nopython).
+# Les deux bits d'équilibrage marquent l'ion qui a reçu le complément ;
+# seuls CAPPED et WATER_EXCESS donnent un message utilisateur.
+_FLAG_CAPPED = 1          # correction plafonnée à ±60% de la cible
+_FLAG_CUT = 2             # valeur ajustée ramenée à zéro
+_FLAG_WATER_EXCESS = 4    # l'eau de source dépasse le besoin
+_FLAG_CAT_IMBALANCE = 8   # excès cationique compensé via NO3
+_FLAG_AN_IMBALANCE = 16   # excès anionique compensé via K/Ca
+
+
+# Signature partagée entre le JIT et la compilation AOT (build_kernels.py)
+_KERNEL_SIG = (
+    'Tuple((f8[:], f8[:], f8[:], u4[:]))'
+    '(f8[:], f8[:], f8[:], f8[:], f8[:], b1[:], b1[:], b1[:], f8, f8)'
+)
+
+
+def _recipe_kernel_py(t, a, u, w, val, cat_mask, an_mask, scale_mask, target_ec, correction_factor):
+    """
+    Étapes A-D du calcul Voogt sur vecteurs float64 de longueur 7.
+    Retourne (ajusté, goutteur, besoin net, drapeaux uint32 par élément).
+    """
+    n = t.shape[0]
+    adj = np.empty(n, dtype=np.float64)
+    flags = np.zeros(n, dtype=np.uint32)
+
+    # A. Feedback (Ajustement) — plafonnement à ±60% de la cible,
+    # avec accumulation des meq cation/anion dans la même passe.
+    meq_cat = 0.0
+    meq_an = 0.0
+    for i in range(n):
+        raw_corr = (t[i] - a[i]) * correction_factor
+        # Équivalent scalaire de np.clip(raw_corr, -0.6*t, 0.6*t) :
+        # min/max se compilent en instructions vectorielles, sans branche.
+        corr = min(max(raw_corr, -0.6 * t[i]), 0.6 * t[i])
+        if corr != raw_corr:
+            flags[i] |= _FLAG_CAPPED
+        base = u[i] + corr
+        if base < 0.0:
+            base = 0.0
+            flags[i] |= _FLAG_CUT
+        adj[i] = base
+        if cat_mask[i]:
+            meq_cat += base * val[i]
+        elif an_mask[i]:
+            meq_an += base * val[i]
+
+    # B. Équilibrage Ionique — le meq cationique post-équilibrage se déduit
+    # analytiquement (inchangé côté NO3, +|déséquilibre| côté K/Ca), donc
+    # pas de seconde sommation avant la correction EC.
+    imbalance = meq_cat - meq_an
+    meq_cat_post = meq_cat
+    if imbalance > 0.1:
+        adj[_NO3_IDX] += imbalance / val[_NO3_IDX]
+        flags[_NO3_IDX] |= _FLAG_CAT_IMBALANCE
+    elif imbalance < -0.1:
+        missing = -imbalance
+        adj[_K_IDX] += (missing * 0.5) / val[_K_IDX]
+        adj[_CA_IDX] += (missing * 0.5) / val[_CA_IDX]
+        flags[_K_IDX] |= _FLAG_AN_IMBALANCE
+        flags[_CA_IDX] |= _FLAG_AN_IMBALANCE
+        meq_cat_post = meq_cat + missing
+
+    # C. Correction EC
+    if meq_cat_post < 0.1:
+        meq_cat_post = 0.1
+    estimated_ec = meq_cat_post / 10.0
+    if estimated_ec < 0.2:
+        estimated_ec = 0.2
+    ec_ratio = target_ec / estimated_ec
+
+    # D. Rescale EC puis soustraction Eau Brute
+    final = np.empty(n, dtype=np.float64)
+    needs = np.empty(n, dtype=np.float64)
+    for i in range(n):
+        f = adj[i] * ec_ratio if scale_mask[i] else adj[i]
+        final[i] = f
+        need = f - w[i]
+        if need < 0.0:
+            need = 0.0
+            flags[i] |= _FLAG_WATER_EXCESS
+        needs[i] = need
+
+    return adj, final, needs, flags
+
+
+try:
+    # Noyau AOT (python build_kernels.py) : aucun coût JIT par processus,
+    # utile pour les déploiements où le cache disque de Numba ne survit pas.
+    from recipe_kernel import recipe as _recipe_kernel
+except ImportError:
+    _recipe_kernel = njit(cache=True)(_recipe_kernel_py)
+
+
+# Capture locale de dict.get : pas de résolution d'attribut par élément
+_get = dict.get
+
+
+def _to_vec(d, _keys=ELEMENTS):
+    """Un seul parcours du dict -> vecteur float64 dans l'ordre canonique."""
+    return np.fromiter((_get(d, k, 0.0) for k in _keys), np.float64, count=7)
+
+
+def _decode_flags(flags):
+    """Traduit le masque de bits du noyau en messages lisibles (hors chemin chaud)."""
+    warnings = []
+    for i, el in enumerate(ELEMENTS):
+        if flags[i] & _FLAG_CAPPED:
+            warnings.append(f"⚠️ {el} : Correction plafonnée (Sécurité).")
+    for i, el in enumerate(ELEMENTS):
+        if flags[i] & _FLAG_WATER_EXCESS:
+            warnings.append(f"🚨 {el} : Surcharge via Eau de Source.")
+    return warnings
+
+
+class NutrientVector(NamedTuple):
+    """
+    Vecteur de concentrations nommé dans l'ordre ELEMENTS : hashable
+    nativement (clé de cache compacte) et bien plus léger qu'un dict
+    de 7 flottants boxés.
+    """
+    NO3: float
+    H2PO4: float
+    SO4: float
+    K: float
+    Ca: float
+    Mg: float
+    NH4: float
+
+
+class ComputeResult(NamedTuple):
+    """Sortie brute du noyau : vecteurs float64 dans l'ordre ELEMENTS."""
+    target: np.ndarray
+    analysis: np.ndarray
+    adjusted: np.ndarray
+    final_drip: np.ndarray
+    water: np.ndarray
+    needs: np.ndarray
+    flags: np.ndarray
+
+
+class VoogtNutrientAlgorithm:
+    # Tables au niveau classe : rien n'est alloué par instance, donc la
+    # construction de l'objet à chaque rerun Streamlit est gratuite.
+    # Le dict de valences reste exposé pour l'introspection ; le calcul
+    # passe par le vecteur _VAL.
+    elements: ClassVar[tuple] = ELEMENTS
+    valences: ClassVar[dict] = VALENCES
+
+    def compute_vec(self, X, target_ec, correction_factor):
+        """
+        Chemin SoA : X est un tableau (4, 7) float64 dont les lignes sont
+        (cible, analyse, absorption, eau) dans l'ordre ELEMENTS. Une seule
+        zone mémoire contiguë, aucun dict ni boxing de flottants.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        adj, final, needs, flags = _recipe_kernel(
+            X[0], X[1], X[2], X[3], _VAL, _CAT_MASK, _AN_MASK, _SCALE_MASK,
+            float(target_ec), float(correction_factor)
+        )
+        return ComputeResult(X[0], X[1], adj, final, X[3], needs, flags)
+
+    def compute(self, target_vals, analysis_vals, uptake_vals, water_vals, target_ec, correction_factor):
+        """
+        Chemin purement numérique (~µs) : aucune construction pandas.
+        À privilégier pour les appels batch/headless ; l'UI enveloppe le
+        résultat via to_dataframe() quand elle affiche le tableau.
+        """
+        X = np.stack((_to_vec(target_vals), _to_vec(analysis_vals),
+                      _to_vec(uptake_vals), _to_vec(water_vals)))
+        return self.compute_vec(X, target_ec, correction_factor)
+
+    def warnings(self, result):
+        """Messages lisibles dérivés du masque de drapeaux d'un résultat."""
+        return _decode_flags(result.flags)
+
+    def to_dataframe(self, result):
+        """Emballe un ComputeResult dans le tableau d'affichage (arrondi à 2)."""
+        # Un seul bloc contigu : pas d'alignement d'index colonne par colonne,
+        # et l'arrondi se fait en place sur le tableau avant l'emballage pandas.
+        data = np.stack([result.target, result.analysis, result.adjusted,
+                         result.final_drip, result.water, result.needs], axis=1)
+        np.round(data, 2, out=data)
+        return pd.DataFrame(data, index=list(ELEMENTS), columns=_RESULT_COLUMNS)
+
+    def calculate_drip_recipe(self, target_vals, analysis_vals, uptake_vals, water_vals, target_ec, correction_factor):
+        """Façade historique : (DataFrame, alertes, dict goutteur)."""
+        result = self.compute(target_vals, analysis_vals, uptake_vals, water_vals, target_ec, correction_factor)
+        return (
+            self.to_dataframe(result),
+            _decode_flags(result.flags),
+            dict(zip(ELEMENTS, result.final_drip)),
+        )
+
+
+# Échauffement du JIT à l'import : la première soumission utilisateur
+# ne paie pas le temps de compilation (le cache disque couvre les suivants).
+_recipe_kernel(
+    np.zeros(7), np.zeros(7), np.zeros(7), np.zeros(7),
+    _VAL, _CAT_MASK, _AN_MASK, _SCALE_MASK, 1.0, 0.5
+)